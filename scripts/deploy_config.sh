@@ -4,6 +4,8 @@ COMMON_ENV_VARS=(
     'TABLE_NAME=${TABLE_NAME}'
     'LOCALSTACK_ENDPOINT=http://localstack:4566'
     'AWS_REGION=${REGION}'
+    'LOG_LEVEL=INFO'
+    'WARMUP=1'
 )
 
 # Lambda-specific configurations
@@ -1,75 +1,246 @@
 # src/common/aws_clients.py
 import os
+import json
+import hmac
+import hashlib
+import datetime
+from urllib.parse import quote, urlsplit
 import boto3
 from botocore.config import Config
 from boto3.dynamodb.types import TypeDeserializer
 import logging
 from decimal import Decimal
 
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib json module
+    orjson = None
+
+def _resolve_log_level(name):
+    """Map a LOG_LEVEL name to a logging level, falling back to INFO for unknown values."""
+    level = logging.getLevelName(str(name).strip().upper())
+    return level if isinstance(level, int) else logging.INFO
+
+# Shared by the handlers so a bad LOG_LEVEL can't break every Lambda at import
+LOG_LEVEL = _resolve_log_level(os.environ.get("LOG_LEVEL", "INFO"))
+
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
 
 _deserializer = TypeDeserializer()
 
+# One session per container: clients created from it share the loader cache
+_session = boto3.session.Session()
+_clients = {}
+
+# Connection settings are read once per container (see reset_clients)
+_endpoint_url = os.environ.get('LOCALSTACK_ENDPOINT')
+_region = os.environ.get('AWS_REGION', 'us-east-1')
+
+# keep sockets alive and pooled so warm invocations skip the TCP/TLS handshake
+_config = Config(
+    retries={'max_attempts': 2, 'mode': 'standard'},
+    connect_timeout=5,
+    read_timeout=5,
+    max_pool_connections=int(os.environ.get('BOTO_POOL', '10')),
+    tcp_keepalive=True,
+)
+
+# SigV4 signing key for presign_get, derived once per UTC day: (datestamp, key)
+_signing_key = (None, None)
+
+def reset_clients():
+    """
+    Drop cached clients and re-read connection settings from the environment.
+    The module-level S3/DDB clients are not rebuilt.
+    """
+    global _endpoint_url, _region, _signing_key
+    _clients.clear()
+    _endpoint_url = os.environ.get('LOCALSTACK_ENDPOINT')
+    _region = os.environ.get('AWS_REGION', 'us-east-1')
+    _signing_key = (None, None)
+
 def boto3_client(service_name):
-    """Create a boto3 client configured for LocalStack"""
-    endpoint_url = os.environ.get('LOCALSTACK_ENDPOINT')
-    region = os.environ.get('AWS_REGION', 'us-east-1')
-
-    logger.debug(f"boto3_client() called for service: {service_name}")
-    logger.debug(f"LOCALSTACK_ENDPOINT={endpoint_url!r}, AWS_REGION={region!r}")
-    logger.debug(f"AWS_ACCESS_KEY_ID present: {'AWS_ACCESS_KEY_ID' in os.environ}, AWS_SECRET_ACCESS_KEY present: {'AWS_SECRET_ACCESS_KEY' in os.environ}")
-
-    
-    config = Config(
-        retries={'max_attempts': 2},
-        connect_timeout=5,
-        read_timeout=5
-    )
-    
+    """Create (or reuse) a boto3 client configured for LocalStack"""
+    client = _clients.get(service_name)
+    if client is not None:
+        return client
+
+    logger.debug("boto3_client() called for service: %s", service_name)
+    logger.debug("LOCALSTACK_ENDPOINT=%r, AWS_REGION=%r", _endpoint_url, _region)
+    logger.debug("AWS_ACCESS_KEY_ID present: %s, AWS_SECRET_ACCESS_KEY present: %s", 'AWS_ACCESS_KEY_ID' in os.environ, 'AWS_SECRET_ACCESS_KEY' in os.environ)
+
     try:
         logger.debug("Attempting to create boto3 client...")
-        client = boto3.client(
+        client = _session.client(
             service_name,
-            endpoint_url=endpoint_url or None,
-            region_name=region,
+            endpoint_url=_endpoint_url or None,
+            region_name=_region,
             aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID', 'test'),
             aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY', 'test'),
-            config=config
+            config=_config
         )
-        logger.debug(f"boto3 client created successfully for service: {service_name}")
+        logger.debug("boto3 client created successfully for service: %s", service_name)
+        _clients[service_name] = client
         return client
     except Exception:
-        logger.exception(f"Failed to create boto3 client for service: {service_name}")
+        logger.exception("Failed to create boto3 client for service: %s", service_name)
         raise
 
-def _convert_decimals(obj):
-    """Recursively convert Decimal to int or float inside data structures."""
-    if isinstance(obj, Decimal):
-        # prefer int when there's no fractional part
-        if obj == obj.to_integral_value():
-            return int(obj)
-        return float(obj)
-    if isinstance(obj, dict):
-        return {k: _convert_decimals(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_convert_decimals(v) for v in obj]
-    return obj
+def _get_signing_key(datestamp):
+    """Return the SigV4 S3 signing key for datestamp, re-deriving it when the day rolls over."""
+    global _signing_key
+    cached_date, key = _signing_key
+    if cached_date != datestamp:
+        secret = os.environ.get('AWS_SECRET_ACCESS_KEY', 'test')
+        key = ("AWS4" + secret).encode()
+        for part in (datestamp, _region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        _signing_key = (datestamp, key)
+    return key
+
+def presign_get_many(bucket, keys, expires):
+    """
+    Build SigV4 presigned GET URLs for several S3 objects without going through botocore.
+    The timestamp, credential scope, query string and signing key are shared, so each
+    key only costs one canonical-request hash and one HMAC.
+    Uses path-style URLs against LOCALSTACK_ENDPOINT, virtual-hosted URLs otherwise.
+    """
+    amz_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    datestamp = amz_date[:8]
+
+    if _endpoint_url:
+        parts = urlsplit(_endpoint_url)
+        host = parts.netloc
+        base = f"{parts.scheme}://{host}"
+        prefix = f"/{bucket}/"
+    else:
+        s3_host = "s3.amazonaws.com" if _region == "us-east-1" else f"s3.{_region}.amazonaws.com"
+        host = f"{bucket}.{s3_host}"
+        base = f"https://{host}"
+        prefix = "/"
+
+    scope = f"{datestamp}/{_region}/s3/aws4_request"
+    query = {
+        "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+        "X-Amz-Credential": f"{os.environ.get('AWS_ACCESS_KEY_ID', 'test')}/{scope}",
+        "X-Amz-Date": amz_date,
+        "X-Amz-Expires": str(expires),
+        "X-Amz-SignedHeaders": "host",
+    }
+    token = os.environ.get('AWS_SESSION_TOKEN')
+    if token:
+        query["X-Amz-Security-Token"] = token
+    canonical_query = "&".join(f"{k}={quote(v, safe='-_.~')}" for k, v in sorted(query.items()))
+
+    request_tail = f"\n{canonical_query}\nhost:{host}\n\nhost\nUNSIGNED-PAYLOAD"
+    sign_prefix = f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+    signing_key = _get_signing_key(datestamp)
+
+    # bind the per-key calls locally, the loop runs once per UPLOADED item in a page
+    sha256 = hashlib.sha256
+    new_hmac = hmac.new
+    url_suffix = f"?{canonical_query}&X-Amz-Signature="
+    urls = []
+    append = urls.append
+    for key in keys:
+        canonical_uri = quote(prefix + key, safe="/~")
+        request_hash = sha256(f"GET\n{canonical_uri}{request_tail}".encode()).hexdigest()
+        signature = new_hmac(signing_key, (sign_prefix + request_hash).encode(), sha256).hexdigest()
+        append(base + canonical_uri + url_suffix + signature)
+    return urls
+
+def presign_get(bucket, key, expires):
+    """Build a single SigV4 presigned GET URL (see presign_get_many)."""
+    return presign_get_many(bucket, [key], expires)[0]
+
+def warm_clients(s3=None, bucket=None):
+    """
+    Pay the S3 signing first-call costs (endpoint resolution, signer setup, SigV4
+    key derivation) at import time instead of on the first request. Enabled with
+    WARMUP=1, which is the default inside Lambda; failures are logged and ignored.
+    Only signing is warmed: it needs no network. Warming the shared DDB client
+    would take a real round trip (e.g. ListTables, which also needs the
+    dynamodb:ListTables permission) on its 5s-timeout config during init.
+    """
+    default = "1" if "AWS_LAMBDA_FUNCTION_NAME" in os.environ else "0"
+    if os.environ.get("WARMUP", default) != "1":
+        return
+    try:
+        if s3 is not None and bucket:
+            s3.generate_presigned_url("get_object", Params={"Bucket": bucket, "Key": "__warmup__"}, ExpiresIn=1)
+            presign_get(bucket, "__warmup__", 1)
+    except Exception as e:
+        logger.warning("Client warm-up failed: %s", e)
+
+def _decimal_default(o):
+    if isinstance(o, Decimal):
+        return int(o) if o == o.to_integral_value() else float(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+class DecimalEncoder(json.JSONEncoder):
+    """JSON encoder that writes DynamoDB Decimals as int (no fractional part) or float."""
+
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return _decimal_default(o)
+        return super().default(o)
+
+if orjson is not None:
+    def json_dumps(obj):
+        """Serialize obj to a compact JSON string (Decimals as int/float)."""
+        return orjson.dumps(obj, default=_decimal_default).decode()
+
+    json_loads = orjson.loads
+else:
+    def json_dumps(obj):
+        """Serialize obj to a compact JSON string (Decimals as int/float)."""
+        return json.dumps(obj, cls=DecimalEncoder, separators=(",", ":"))
+
+    json_loads = json.loads
+
+def _deserialize_value(av):
+    """
+    Fast path for the attribute types this service writes (S and N); anything
+    else goes through boto3's TypeDeserializer.
+    """
+    if "S" in av:
+        return av["S"]
+    if "N" in av:
+        n = av["N"]
+        if n.isdigit() or (n[:1] == "-" and n[1:].isdigit()):
+            return int(n)
+        return float(n)
+    return _deserializer.deserialize(av)
 
 def deserialize_item(item):
     """
-    Convert a single DynamoDB AttributeValue map to a plain Python dict
-    with Decimal converted to int/float for JSON serialization.
+    Convert a single DynamoDB AttributeValue map to a plain Python dict.
+    Top-level numbers become int/float; nested ones stay Decimal, so
+    serialize responses with json_dumps (which writes Decimals as int/float).
     """
     if not item:
         return {}
     try:
-        raw = {k: _deserializer.deserialize(v) for k, v in item.items()}
-        return _convert_decimals(raw)
+        return {k: _deserialize_value(v) for k, v in item.items()}
     except Exception:
         logger.exception("Failed to deserialize DynamoDB item")
         raise
 
 def deserialize_items(items):
     """Deserialize a list of DynamoDB items."""
-    return [deserialize_item(it) for it in (items or [])]
\ No newline at end of file
+    if not items:
+        return []
+    deser = _deserialize_value
+    try:
+        return [{k: deser(v) for k, v in it.items()} for it in items]
+    except Exception:
+        logger.exception("Failed to deserialize DynamoDB items")
+        raise
+
+
+# Shared clients, created once per container from the single session above;
+# handlers import these instead of building their own
+S3 = boto3_client("s3")
+DDB = boto3_client("dynamodb")
+warm_clients(S3, bucket=os.environ.get("BUCKET_NAME", "image-service-root"))
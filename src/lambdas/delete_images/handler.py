@@ -1,136 +1,280 @@
 """Lambda function to delete an image: remove object from S3 and item from DynamoDB."""
 
 import os
-import json
+import time
 import logging
-from common.aws_clients import boto3_client, deserialize_item
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from common.aws_clients import S3, DDB, json_dumps, json_loads, deserialize_item, LOG_LEVEL
 
 # Configure logging
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-
-S3 = boto3_client("s3")
-DDB = boto3_client("dynamodb")
+logger.setLevel(LOG_LEVEL)
 
 # Environment configuration
 BUCKET_NAME = os.environ.get("BUCKET_NAME", "image-service-root")
 TABLE_NAME = os.environ.get("TABLE_NAME", "ImagesMetadata")
 
+# S3 DeleteObjects accepts at most 1000 keys per request
+S3_DELETE_BATCH = 1000
+# DynamoDB BatchGetItem / BatchWriteItem request limits
+DDB_BATCH_GET = 100
+DDB_BATCH_WRITE = 25
+# Retries for Unprocessed{Keys,Items}, with exponential backoff starting at BATCH_BACKOFF seconds
+BATCH_MAX_ATTEMPTS = 5
+BATCH_BACKOFF = 0.05
+
+# In bulk deletes the S3 and DynamoDB sides are independent, so the S3 side runs on
+# this pool while the handler thread talks to DynamoDB (keep BOTO_POOL >= 2 * DEL_PARALLEL)
+_EXEC = ThreadPoolExecutor(max_workers=int(os.environ.get("DEL_PARALLEL", "4")))
+
 
 def respond(status, body):
-    return {"statusCode": status, "body": json.dumps(body)}
-
-
-def _get_ddb_item(user_id: str, image_id: str):
-    """Fetch item from DynamoDB (returns deserialized dict or None)."""
-    logger.debug(f"Fetching DDB item for user_id={user_id}, image_id={image_id}")
-    resp = DDB.get_item(
-        TableName=TABLE_NAME,
-        Key={"user_id": {"S": str(user_id)}, "image_id": {"S": str(image_id)}},
-        ConsistentRead=True,
-    )
-    item = resp.get("Item")
-    if not item:
-        logger.debug("DynamoDB item not found")
-        return None
-    des = deserialize_item(item)
-    logger.debug(f"Deserialized DDB item: {json.dumps(des)}")
-    return des
+    return {"statusCode": status, "body": json_dumps(body)}
+
+
+def _ddb_key(user_id: str, image_id: str):
+    return {"user_id": {"S": str(user_id)}, "image_id": {"S": str(image_id)}}
+
+
+def _drain_batch(call, request_items, unprocessed_field):
+    """
+    Issue a DynamoDB batch call and resubmit whatever comes back under
+    unprocessed_field with exponential backoff.
+    Returns (responses, request items still unprocessed after the last attempt).
+    """
+    responses = []
+    for attempt in range(BATCH_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(BATCH_BACKOFF * 2 ** (attempt - 1))
+        resp = call(RequestItems=request_items)
+        responses.append(resp)
+        request_items = resp.get(unprocessed_field)
+        if not request_items:
+            break
+    return responses, request_items or {}
+
+
+def _batch_get_items(user_id: str, image_ids):
+    """Fetch several items with BatchGetItem, return {image_id: deserialized item} for those found."""
+    found = {}
+    for i in range(0, len(image_ids), DDB_BATCH_GET):
+        chunk = image_ids[i:i + DDB_BATCH_GET]
+        logger.debug("BatchGetItem for %s keys", len(chunk))
+        # eventually consistent (half the RCUs): s3_key never changes, and a status read a moment
+        # stale is the same race as an upload finishing right after the delete
+        request = {TABLE_NAME: {"Keys": [_ddb_key(user_id, image_id) for image_id in chunk]}}
+        responses, unprocessed = _drain_batch(DDB.batch_get_item, request, "UnprocessedKeys")
+        if unprocessed:
+            raise RuntimeError(f"BatchGetItem left {len(unprocessed[TABLE_NAME]['Keys'])} keys unprocessed")
+        for resp in responses:
+            for item in resp.get("Responses", {}).get(TABLE_NAME, []):
+                des = deserialize_item(item)
+                found[des.get("image_id")] = des
+    return found
+
+
+def _batch_delete_items(user_id: str, image_ids):
+    """Delete several items with BatchWriteItem, return the set of image_ids that were not deleted."""
+    failed = set()
+    for i in range(0, len(image_ids), DDB_BATCH_WRITE):
+        chunk = image_ids[i:i + DDB_BATCH_WRITE]
+        logger.debug("BatchWriteItem deleting %s items", len(chunk))
+        request = {TABLE_NAME: [{"DeleteRequest": {"Key": _ddb_key(user_id, image_id)}} for image_id in chunk]}
+        try:
+            _, unprocessed = _drain_batch(DDB.batch_write_item, request, "UnprocessedItems")
+        except Exception:
+            logger.exception("DynamoDB batch_write_item failed for %s items", len(chunk))
+            failed.update(chunk)
+            continue
+        for req in unprocessed.get(TABLE_NAME, []):
+            image_id = req["DeleteRequest"]["Key"]["image_id"]["S"]
+            logger.warning("DynamoDB delete left unprocessed for image_id=%s", image_id)
+            failed.add(image_id)
+    return failed
 
 
 def _delete_s3_object(bucket: str, key: str):
     """Delete object from S3, return True on success."""
-    logger.debug(f"Deleting S3 object: bucket={bucket}, key={key}")
+    logger.debug("Deleting S3 object: bucket=%s, key=%s", bucket, key)
     try:
         S3.delete_object(Bucket=bucket, Key=key)
         logger.debug("S3 delete_object succeeded")
         return True
     except Exception:
-        logger.exception(f"S3 delete_object failed for key={key}")
+        logger.exception("S3 delete_object failed for key=%s", key)
         return False
 
 
+def _delete_s3_objects(bucket: str, keys):
+    """Delete objects from S3 in batches, return the set of keys that failed."""
+    failed = set()
+    for i in range(0, len(keys), S3_DELETE_BATCH):
+        chunk = keys[i:i + S3_DELETE_BATCH]
+        logger.debug("Deleting %s S3 objects from bucket=%s", len(chunk), bucket)
+        try:
+            resp = S3.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True},
+            )
+        except Exception:
+            logger.exception("S3 delete_objects failed for %s keys", len(chunk))
+            failed.update(chunk)
+            continue
+        for err in resp.get("Errors", []):
+            logger.warning("S3 delete_objects failed for key=%s: %s", err.get("Key"), err.get("Message"))
+            failed.add(err.get("Key"))
+    return failed
+
+
 def _delete_ddb_item(user_id: str, image_id: str):
-    """Delete item from DynamoDB."""
-    logger.debug(f"Deleting DDB item for user_id={user_id}, image_id={image_id}")
+    """
+    Delete item from DynamoDB, returning the deleted item (deserialized) or None
+    when it did not exist. The condition and ALL_OLD make a prior GetItem unnecessary.
+    """
+    logger.debug("Deleting DDB item for user_id=%s, image_id=%s", user_id, image_id)
     try:
-        DDB.delete_item(
+        resp = DDB.delete_item(
             TableName=TABLE_NAME,
             Key={"user_id": {"S": str(user_id)}, "image_id": {"S": str(image_id)}},
+            ConditionExpression="attribute_exists(image_id)",
+            ReturnValues="ALL_OLD",
         )
-        logger.debug("DynamoDB delete_item succeeded")
-        return True
-    except Exception:
-        logger.exception("DynamoDB delete_item failed")
-        return False
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            logger.debug("DynamoDB item not found")
+            return None
+        raise
+    logger.debug("DynamoDB delete_item succeeded")
+    des = deserialize_item(resp.get("Attributes"))
+    logger.debug("Deleted DDB item: %s", des)
+    return des
+
+
+def _resolve_s3_key(user_id: str, image_id: str, item: dict):
+    """Return the S3 key recorded on the item, falling back to the upload key format."""
+    s3_key = item.get("s3_key") or item.get("key")
+    # fallback: if s3_key missing, attempt to construct from available data
+    if not s3_key:
+        filename = item.get("filename")
+        if filename:
+            s3_key = f"{user_id}/{image_id}_{filename}"
+            logger.debug("Constructed s3_key fallback=%s", s3_key)
+        else:
+            logger.warning("No s3_key or filename available to delete object")
+            s3_key = None
+    return s3_key
+
+
+def _delete_many(user_id: str, image_ids):
+    """Delete several images of one user using batched DynamoDB and S3 calls."""
+    image_ids = list(dict.fromkeys(image_ids))
+    items = _batch_get_items(user_id, image_ids)
+
+    s3_keys = {}
+    to_delete = []
+    for image_id, item in items.items():
+        s3_key = _resolve_s3_key(user_id, image_id, item)
+        s3_keys[image_id] = s3_key
+        if s3_key and item.get("status") == "UPLOADED":
+            to_delete.append(s3_key)
+
+    s3_future = _EXEC.submit(_delete_s3_objects, BUCKET_NAME, to_delete) if to_delete else None
+    failed_ddb = _batch_delete_items(user_id, list(items)) if items else set()
+    failed_s3 = s3_future.result() if s3_future else set()
+
+    results = []
+    for image_id in image_ids:
+        if image_id not in items:
+            results.append({"image_id": image_id, "error": "image not found"})
+            continue
+        s3_key = s3_keys[image_id]
+        if not s3_key:
+            s3_deleted = True
+        else:
+            s3_deleted = items[image_id].get("status") == "UPLOADED" and s3_key not in failed_s3
+        results.append({
+            "image_id": image_id,
+            "s3_key": s3_key,
+            "s3_deleted": s3_deleted,
+            "ddb_deleted": image_id not in failed_ddb,
+        })
+    return results
 
 
 def handler(event, context):
     """
     Expects JSON body:
       { "user_id": "user123", "image_id": "uuid-or-id" }
-    Optionally can accept queryStringParameters with same keys.
+    or, to delete several images at once:
+      { "user_id": "user123", "image_ids": ["id1", "id2", ...] }
+    Optionally can accept queryStringParameters with same keys
+    (image_ids as a comma separated string).
     """
-    logger.debug(f"Event received: {json.dumps(event)}")
-    logger.debug(f"Environment: BUCKET_NAME={BUCKET_NAME}, TABLE_NAME={TABLE_NAME}")
+    logger.debug("Event received: %s", event)
+    logger.debug("Environment: BUCKET_NAME=%s, TABLE_NAME=%s", BUCKET_NAME, TABLE_NAME)
 
     try:
         body = event.get("body")
-        payload = json.loads(body) if isinstance(body, str) and body else (body or {})
+        payload = json_loads(body) if isinstance(body, str) and body else (body or {})
         if not payload:
             payload = event.get("queryStringParameters") or {}
-        logger.debug(f"Parsed payload: {json.dumps(payload)}")
+        logger.debug("Parsed payload: %s", payload)
 
         user_id = payload.get("user_id")
         image_id = payload.get("image_id")
+        image_ids = payload.get("image_ids")
+
+        if image_ids is not None:
+            if isinstance(image_ids, str):
+                image_ids = [i for i in image_ids.split(",") if i]
+            if not user_id or not isinstance(image_ids, list) or not image_ids:
+                logger.warning("Missing required fields user_id or image_ids")
+                return respond(400, {"error": "user_id and a non-empty image_ids list are required"})
+            if any(isinstance(i, bool) or not isinstance(i, (str, int)) for i in image_ids):
+                logger.warning("Invalid image_ids entries: %s", image_ids)
+                return respond(400, {"error": "image_ids must contain only string or integer ids"})
+            # DynamoDB returns image_id as a string; normalize so results line up with the batch get
+            image_ids = [str(i) for i in image_ids]
+            results = _delete_many(user_id, image_ids)
+            logger.debug("Bulk delete result: %s", results)
+            return respond(200, {"user_id": user_id, "results": results})
 
         if not user_id or not image_id:
             logger.warning("Missing required fields user_id or image_id")
             return respond(400, {"error": "user_id and image_id are required"})
 
-        # Fetch the DDB item to learn the s3_key (and filename if needed)
-        item = _get_ddb_item(user_id, image_id)
-        if not item:
+        # Delete the DDB item; the returned old image gives the s3_key and status
+        item = _delete_ddb_item(user_id, image_id)
+        if item is None:
             return respond(404, {"error": "image not found"})
 
-        s3_key = item.get("s3_key") or item.get("key")
-        # fallback: if s3_key missing, attempt to construct from available data
-        if not s3_key:
-            filename = item.get("filename")
-            if filename:
-                s3_key = f"{user_id}/{image_id}_{filename}"
-                logger.debug(f"Constructed s3_key fallback={s3_key}")
-            else:
-                logger.warning("No s3_key or filename available to delete object")
-                s3_key = None
+        s3_key = _resolve_s3_key(user_id, image_id, item)
 
         # Delete S3 object only when the DDB item status == "UPLOADED"
         status = item.get("status")
-        logger.debug(f"Item status: {status}")
+        logger.debug("Item status: %s", status)
         s3_deleted = True
         if s3_key:
             if status == "UPLOADED":
                 logger.debug("Status is UPLOADED; deleting S3 object")
                 s3_deleted = _delete_s3_object(BUCKET_NAME, s3_key)
             else:
-                logger.info(f"Skipping S3 delete because item status != 'UPLOADED' (status={status})")
+                logger.info("Skipping S3 delete because item status != 'UPLOADED' (status=%s)", status)
                 s3_deleted = False
         else:
             logger.debug("Skipping S3 delete since no key provided")
-            
-        # Delete DynamoDB item
-        ddb_deleted = _delete_ddb_item(user_id, image_id)
 
         resp_body = {
             "image_id": image_id,
             "user_id": user_id,
             "s3_key": s3_key,
             "s3_deleted": s3_deleted,
-            "ddb_deleted": ddb_deleted,
+            "ddb_deleted": True,
         }
-        logger.debug(f"Delete result: {json.dumps(resp_body)}")
+        logger.debug("Delete result: %s", resp_body)
         return respond(200, resp_body)
 
     except Exception as e:
-        logger.error(f"Unhandled error in delete handler: {str(e)}", exc_info=True)
+        logger.error("Unhandled error in delete handler: %s", e, exc_info=True)
         return respond(500, {"error": str(e)})
\ No newline at end of file
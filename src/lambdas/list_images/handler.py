@@ -2,37 +2,55 @@
 """Lambda function for listing images for a user with optional filters and pagination."""
 
 import os
-import json
 import time
 import base64
 import logging
-from common.aws_clients import boto3_client, deserialize_items
+from common.aws_clients import DDB, json_dumps, json_loads, deserialize_items, presign_get_many, LOG_LEVEL
 
 # Configure logging
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-
-S3 = boto3_client("s3")
-DDB = boto3_client("dynamodb")
+logger.setLevel(LOG_LEVEL)
 
 # Environment configuration
 BUCKET_NAME = os.environ.get("BUCKET_NAME", "image-service-root")
 TABLE_NAME = os.environ.get("TABLE_NAME", "ImagesMetadata")
 PRESIGN_EXP = int(os.environ.get("PRESIGN_EXP", "900"))  # seconds
 PAGE_SIZE = int(os.environ.get("PAGE_SIZE", os.environ.get("PAGE_LIMIT", "10")))
+# Upper bound for a caller supplied page_size, and for the items gathered by fetch_all
+# (DynamoDB also stops each Query page at 1 MB and returns a LastEvaluatedKey)
+MAX_PAGE_SIZE = 1000
+# at least 1: a fetch_all Query with Limit=0 is rejected by DynamoDB
+MAX_TOTAL = max(1, int(os.environ.get("MAX_TOTAL", "1000")))
+
+# Only fetch the attributes the response is built from ("key" is the legacy s3_key name)
+PROJECTION_NAMES = {
+    "#iid": "image_id",
+    "#fn": "filename",
+    "#ct": "content_type",
+    "#ca": "created_at",
+    "#st": "status",
+    "#sk": "s3_key",
+    "#ky": "key",
+    "#bk": "bucket",
+}
+PROJECTION_EXPR = ",".join(PROJECTION_NAMES)
 
 
 def respond(status, body):
-    return {"statusCode": status, "body": json.dumps(body)}
+    return {"statusCode": status, "body": json_dumps(body)}
 
 
-def _encode_token(token_obj):
-    return base64.urlsafe_b64encode(json.dumps(token_obj).encode()).decode()
+def _encode_token(last_key):
+    """Encode a LastEvaluatedKey ({"user_id": {"S": u}, "image_id": {"S": i}}) as an opaque token."""
+    raw = f"{last_key['user_id']['S']}\x1f{last_key['image_id']['S']}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
 
 
 def _decode_token(token_str):
     try:
-        return json.loads(base64.urlsafe_b64decode(token_str.encode()).decode())
+        pad = "=" * (-len(token_str) % 4)
+        user_id, image_id = base64.urlsafe_b64decode(token_str + pad).decode().split("\x1f", 1)
+        return {"user_id": {"S": user_id}, "image_id": {"S": image_id}}
     except Exception:
         return None
 
@@ -44,25 +62,28 @@ def handler(event, context):
         "user_id": "user123",           # required
         "filename": "pic.png",         # optional (substring match)
         "content_type": "image/png",   # optional (exact match)
-        "page_token": "..."            # optional (opaque token returned by previous response)
+        "page_token": "...",           # optional (opaque token returned by previous response)
+        "page_size": 50,               # optional (defaults to PAGE_SIZE, capped at MAX_PAGE_SIZE)
+        "fetch_all": true              # optional (follow pagination server side, up to MAX_TOTAL items;
+                                       #  without page_size each Query asks for all remaining items)
       }
 
-    Returns paginated list of images (max PAGE_SIZE) with presigned GET URLs.
+    Returns paginated list of images (max page_size) with presigned GET URLs.
     """
-    logger.debug(f"Event received: {json.dumps(event)}")
-    logger.debug(f"Environment: BUCKET_NAME={BUCKET_NAME}, TABLE_NAME={TABLE_NAME}, PAGE_SIZE={PAGE_SIZE}")
+    logger.debug("Event received: %s", event)
+    logger.debug("Environment: BUCKET_NAME=%s, TABLE_NAME=%s, PAGE_SIZE=%s", BUCKET_NAME, TABLE_NAME, PAGE_SIZE)
 
     try:
         body = event.get("body")
         # If body is a JSON string (API Gateway proxy), parse it; otherwise allow direct dict
-        payload = json.loads(body) if isinstance(body, str) and body else (body or {})
-        logger.debug(f"Parsed payload: {json.dumps(payload)}")
+        payload = json_loads(body) if isinstance(body, str) and body else (body or {})
+        logger.debug("Parsed payload: %s", payload)
 
         # Allow queryStringParameters fallback (if API Gateway uses GET)
         if not payload:
             qsp = event.get("queryStringParameters") or {}
             payload.update(qsp)
-            logger.debug(f"Using queryStringParameters payload: {json.dumps(payload)}")
+            logger.debug("Using queryStringParameters payload: %s", payload)
 
         user_id = payload.get("user_id")
         if not user_id:
@@ -72,13 +93,20 @@ def handler(event, context):
         filename_filter = payload.get("filename")
         content_type_filter = payload.get("content_type")
         page_token = payload.get("page_token")
+        fetch_all = str(payload.get("fetch_all", "")).lower() in ("1", "true", "yes")
+        explicit_page_size = bool(payload.get("page_size"))
+        try:
+            page_size = max(1, min(int(payload.get("page_size") or PAGE_SIZE), MAX_PAGE_SIZE))
+        except (TypeError, ValueError):
+            logger.warning("Invalid page_size: %s", payload.get("page_size"))
+            return respond(400, {"error": "page_size must be an integer"})
 
-        logger.debug(f"Filters: filename={filename_filter}, content_type={content_type_filter}, page_token={page_token}")
+        logger.debug("Filters: filename=%s, content_type=%s, page_token=%s, page_size=%s, fetch_all=%s", filename_filter, content_type_filter, page_token, page_size, fetch_all)
 
         # Build DynamoDB Query
         key_condition = "user_id = :uid"
         expr_attr_vals = {":uid": {"S": str(user_id)}}
-        expr_attr_names = {}
+        expr_attr_names = dict(PROJECTION_NAMES)
 
         filter_expr_parts = []
         if filename_filter:
@@ -94,12 +122,12 @@ def handler(event, context):
 
         params = {
             "TableName": TABLE_NAME,
+            "ProjectionExpression": PROJECTION_EXPR,
             "KeyConditionExpression": key_condition,
+            "ExpressionAttributeNames": expr_attr_names,
             "ExpressionAttributeValues": expr_attr_vals,
-            "Limit": PAGE_SIZE,
+            "Limit": page_size,
         }
-        if expr_attr_names:
-            params["ExpressionAttributeNames"] = expr_attr_names
         if filter_expr_parts:
             params["FilterExpression"] = " AND ".join(filter_expr_parts)
 
@@ -107,26 +135,38 @@ def handler(event, context):
         if page_token:
             eks = _decode_token(page_token)
             if eks:
-                logger.debug(f"Decoded ExclusiveStartKey: {json.dumps(eks)}")
+                logger.debug("Decoded ExclusiveStartKey: %s", eks)
                 params["ExclusiveStartKey"] = eks
             else:
                 logger.warning("Failed to decode page_token; ignoring it")
 
-        logger.debug(f"Query params for DynamoDB: {json.dumps({k: v for k, v in params.items() if k != 'ExpressionAttributeValues'})}")
-        logger.debug(f"ExpressionAttributeValues present: {list(expr_attr_vals.keys())}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Query params for DynamoDB: %s", {k: v for k, v in params.items() if k != 'ExpressionAttributeValues'})
+            logger.debug("ExpressionAttributeValues present: %s", list(expr_attr_vals.keys()))
 
-        # Execute Query
+        # Execute Query (with fetch_all, keep following LastEvaluatedKey up to MAX_TOTAL items)
         logger.debug("Executing DynamoDB query...")
-        resp = DDB.query(**params)
-        items = resp.get("Items", [])
-        last_evaluated = resp.get("LastEvaluatedKey")
-        logger.debug(f"DynamoDB returned {len(items)} items, LastEvaluatedKey present: {bool(last_evaluated)}")
-
-        # Deserialize items and generate presigned URLs
+        # Without an explicit page_size, fetch_all asks for everything still missing and lets
+        # DynamoDB's 1 MB page cutoff bound each page, instead of walking PAGE_SIZE-sized pages
+        fetch_page = page_size if explicit_page_size else MAX_TOTAL
+        items = []
+        while True:
+            if fetch_all:
+                params["Limit"] = min(fetch_page, MAX_TOTAL - len(items))
+            resp = DDB.query(**params)
+            items.extend(resp.get("Items", []))
+            last_evaluated = resp.get("LastEvaluatedKey")
+            logger.debug("DynamoDB returned %s items, LastEvaluatedKey present: %s", len(items), bool(last_evaluated))
+            if not fetch_all or not last_evaluated or len(items) >= MAX_TOTAL:
+                break
+            params["ExclusiveStartKey"] = last_evaluated
+
+        # Deserialize items; UPLOADED ones are collected so their URLs are signed in one pass
         results = []
+        to_sign = []
         deserialized = deserialize_items(items)
         for obj in deserialized:
-            logger.debug(f"Item deserialized: {json.dumps(obj)}")
+            logger.debug("Item deserialized: %s", obj)
             status = obj.get("status")
             s3_key = obj.get("s3_key") or obj.get("key")
 
@@ -141,27 +181,25 @@ def handler(event, context):
 
             # Only include S3 info and signed URL when status == "UPLOADED"
             if status == "UPLOADED" and s3_key:
-                try:
-                    presigned_url = S3.generate_presigned_url(
-                        "get_object",
-                        Params={"Bucket": BUCKET_NAME, "Key": s3_key},
-                        ExpiresIn=PRESIGN_EXP,
-                        HttpMethod="GET",
-                    )
-                except Exception as s3_err:
-                    logger.error(f"Failed to generate presigned GET for key={s3_key}: {str(s3_err)}")
-                    presigned_url = None
-
                 item_out.update({
                     "bucket": obj.get("bucket", BUCKET_NAME),
                     "s3_key": s3_key,
-                    "signed_url": presigned_url,
+                    "signed_url": None,
                 })
+                to_sign.append(item_out)
             else:
-                logger.debug(f"Skipping S3 signed URL for item image_id={obj.get('image_id')} status={status}")
+                logger.debug("Skipping S3 signed URL for item image_id=%s status=%s", obj.get('image_id'), status)
 
             results.append(item_out)
 
+        if to_sign:
+            try:
+                # signed locally with a cached SigV4 key instead of botocore's request pipeline
+                urls = presign_get_many(BUCKET_NAME, [it["s3_key"] for it in to_sign], PRESIGN_EXP)
+                for item_out, url in zip(to_sign, urls):
+                    item_out["signed_url"] = url
+            except Exception as s3_err:
+                logger.error("Failed to generate presigned GET URLs for %s items: %s", len(to_sign), s3_err)
 
         response_payload = {
             "items": results,
@@ -172,9 +210,9 @@ def handler(event, context):
             response_payload["next_page_token"] = _encode_token(last_evaluated)
             logger.debug("Next page token generated")
 
-        logger.debug(f"Returning response with {len(results)} items")
+        logger.debug("Returning response with %s items", len(results))
         return respond(200, response_payload)
 
     except Exception as e:
-        logger.error(f"Unhandled error: {str(e)}", exc_info=True)
+        logger.error("Unhandled error: %s", e, exc_info=True)
         return respond(500, {"error": str(e)})
\ No newline at end of file
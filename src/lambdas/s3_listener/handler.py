@@ -1,51 +1,55 @@
 """Process S3->SQS notifications: mark corresponding DDB item as UPLOADED."""
 
 import os
-import json
+import re
 import logging
-import urllib.parse
-from common.aws_clients import boto3_client, deserialize_item
+from urllib.parse import unquote_plus
+from concurrent.futures import ThreadPoolExecutor
+from common.aws_clients import DDB, json_dumps, json_loads, deserialize_item, LOG_LEVEL
 
 # Configure logging
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-
-DDB = boto3_client("dynamodb")
-S3 = boto3_client("s3")
+logger.setLevel(LOG_LEVEL)
 
 # Environment
 TABLE_NAME = os.environ.get("TABLE_NAME", "ImagesMetadata")
 BUCKET_NAME = os.environ.get("BUCKET_NAME", "image-service-root")
 
+# update_item calls for distinct images in one SQS batch are independent and fan out
+# over this pool (the DynamoDB client is thread-safe)
+_EXEC = ThreadPoolExecutor(max_workers=int(os.environ.get("UPDATE_PARALLEL", "8")))
+
+# {user_id}/{image_id}_{filename}: one C-level scan instead of two str.split passes
+_KEY_RE = re.compile(r"^([^/]+)/([^_/]+)_")
+
+# Static part of the status update, shared by every update_item call (botocore does not mutate it)
+_STATUS_UPDATE = {
+    "UpdateExpression": "SET #s = :st",
+    "ExpressionAttributeNames": {"#s": "status"},
+    "ExpressionAttributeValues": {":st": {"S": "UPLOADED"}},
+    "ReturnValues": "ALL_NEW",
+}
+
 
 def respond(status, body):
-    return {"statusCode": status, "body": json.dumps(body)}
+    return {"statusCode": status, "body": json_dumps(body)}
 
 
 def _parse_s3_key(s3_key: str):
     """Expect key format: {user_id}/{image_id}_{filename} -> return (user_id, image_id)"""
     if not s3_key:
         return None, None
-    s3_key = urllib.parse.unquote_plus(s3_key)
-    parts = s3_key.split("/", 1)
-    if len(parts) != 2:
-        return None, None
-    user_id = parts[0]
-    tail = parts[1]
-    image_id = tail.split("_", 1)[0] if "_" in tail else None
-    return user_id, image_id
+    m = _KEY_RE.match(unquote_plus(s3_key))
+    return (m.group(1), m.group(2)) if m else (None, None)
 
 
 def _update_ddb_status(user_id: str, image_id: str):
-    logger.debug(f"Updating DDB status to UPLOADED for user_id={user_id}, image_id={image_id}")
+    logger.debug("Updating DDB status to UPLOADED for user_id=%s, image_id=%s", user_id, image_id)
     try:
         DDB.update_item(
             TableName=TABLE_NAME,
             Key={"user_id": {"S": str(user_id)}, "image_id": {"S": str(image_id)}},
-            UpdateExpression="SET #s = :st",
-            ExpressionAttributeNames={"#s": "status"},
-            ExpressionAttributeValues={":st": {"S": "UPLOADED"}},
-            ReturnValues="ALL_NEW",
+            **_STATUS_UPDATE,
         )
         logger.debug("DynamoDB update_item succeeded")
         return True
@@ -54,43 +58,60 @@ def _update_ddb_status(user_id: str, image_id: str):
         return False
 
 
+def _update_ddb_statuses(targets):
+    """Mark each distinct (user_id, image_id) as UPLOADED, return {target: success}."""
+    if len(targets) == 1:
+        return {targets[0]: _update_ddb_status(*targets[0])}
+    return dict(zip(targets, _EXEC.map(lambda t: _update_ddb_status(*t), targets)))
+
+
 def handler(event, context):
     """
     Lambda triggered by SQS (S3 notifications forwarded to SQS).
     Expects event['Records'] from SQS; each record.body is an S3 event JSON.
-    For each S3 record set corresponding DynamoDB item status -> UPLOADED.
+    For each S3 record set corresponding DynamoDB item status -> UPLOADED;
+    updates for the whole batch are deduplicated and issued concurrently.
     """
-    logger.debug(f"Event received: {json.dumps(event)}")
-    logger.debug(f"Environment: BUCKET_NAME={BUCKET_NAME}, TABLE_NAME={TABLE_NAME}")
+    logger.debug("Event received: %s", event)
+    logger.debug("Environment: BUCKET_NAME=%s, TABLE_NAME=%s", BUCKET_NAME, TABLE_NAME)
 
     processed = []
+    pending = []
     try:
         records = event.get("Records", []) or []
-        logger.debug(f"Number of SQS records: {len(records)}")
+        logger.debug("Number of SQS records: %s", len(records))
         for rec in records:
             try:
                 body = rec.get("body")
-                logger.debug(f"SQS message body: {body}")
-                s3_event = json.loads(body) if isinstance(body, str) else body
+                logger.debug("SQS message body: %s", body)
+                s3_event = json_loads(body) if isinstance(body, str) else body
                 # s3_event contains its own Records array
                 for s3rec in s3_event.get("Records", []):
                     s3_info = s3rec.get("s3", {})
                     bucket = s3_info.get("bucket", {}).get("name")
                     key = s3_info.get("object", {}).get("key")
-                    logger.debug(f"Received S3 event for bucket={bucket}, key={key}")
+                    logger.debug("Received S3 event for bucket=%s, key=%s", bucket, key)
                     user_id, image_id = _parse_s3_key(key)
-                    logger.debug(f"Parsed user_id={user_id}, image_id={image_id}")
+                    logger.debug("Parsed user_id=%s, image_id=%s", user_id, image_id)
                     if not user_id or not image_id:
-                        logger.warning(f"Could not parse user_id/image_id from key={key}; skipping")
+                        logger.warning("Could not parse user_id/image_id from key=%s; skipping", key)
                         processed.append({"key": key, "status": "skipped", "reason": "parse_failed"})
                         continue
 
-                    ok = _update_ddb_status(user_id, image_id)
-                    processed.append({"user_id": user_id, "image_id": image_id, "s3_key": key, "ddb_updated": ok})
+                    entry = {"user_id": user_id, "image_id": image_id, "s3_key": key, "ddb_updated": False}
+                    processed.append(entry)
+                    pending.append(entry)
             except Exception as inner:
                 logger.exception("Failed processing SQS record")
                 processed.append({"error": str(inner)})
-        logger.debug(f"Processing result: {json.dumps(processed)}")
+
+        if pending:
+            targets = list(dict.fromkeys((e["user_id"], e["image_id"]) for e in pending))
+            logger.debug("Updating %s distinct DDB items for %s S3 records", len(targets), len(pending))
+            updated = _update_ddb_statuses(targets)
+            for entry in pending:
+                entry["ddb_updated"] = updated[(entry["user_id"], entry["image_id"])]
+        logger.debug("Processing result: %s", processed)
         return respond(200, {"processed": processed})
     except Exception as e:
         logger.exception("Unhandled error in process_s3_event handler")
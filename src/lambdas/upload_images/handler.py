@@ -2,27 +2,45 @@
 """Lambda function for generating S3 presigned upload URLs."""
 
 import os
-import json
 import time
 import uuid
 import logging
-from common.aws_clients import boto3_client
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from common.aws_clients import S3, DDB, json_dumps, json_loads, LOG_LEVEL
 
 # Configure logging
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-
-S3 = boto3_client("s3")
-DDB = boto3_client("dynamodb")
+logger.setLevel(LOG_LEVEL)
 
 # Environment configuration
 BUCKET_NAME = os.environ.get("BUCKET_NAME", "image-service-root")
 TABLE_NAME = os.environ.get("TABLE_NAME", "ImagesMetadata")
 PRESIGN_EXP = int(os.environ.get("PRESIGN_EXP", "900"))  # seconds
 
+# The DynamoDB write runs here while the handler thread signs the upload URL
+_EXEC = ThreadPoolExecutor(max_workers=2)
+
 
 def respond(status, body):
-    return {"statusCode": status, "body": json.dumps(body)}
+    return {"statusCode": status, "body": json_dumps(body)}
+
+
+def _discard_pending_item(put_future, user_id: str, image_id: str):
+    """Remove the PENDING_UPLOAD row of a request whose upload URL could not be signed."""
+    try:
+        put_future.result()
+    except Exception:
+        # the write itself failed, so there is no row to remove
+        return
+    try:
+        DDB.delete_item(
+            TableName=TABLE_NAME,
+            Key={"user_id": {"S": user_id}, "image_id": {"S": image_id}},
+        )
+        logger.debug("Removed pending item %s after presign failure", image_id)
+    except Exception as ddb_error:
+        logger.error("Failed to remove pending item %s: %s", image_id, ddb_error)
 
 
 def handler(event, context):
@@ -42,52 +60,38 @@ def handler(event, context):
     Also writes metadata to DynamoDB with PK=user_id, SK=image_id
     and status=PENDING_UPLOAD
     """
-    logger.debug(f"Event received: {json.dumps(event)}")
-    logger.debug(f"Environment: BUCKET_NAME={BUCKET_NAME}, TABLE_NAME={TABLE_NAME}")
+    logger.debug("Event received: %s", event)
+    logger.debug("Environment: BUCKET_NAME=%s, TABLE_NAME=%s", BUCKET_NAME, TABLE_NAME)
 
     try:
         body = event.get("body")
-        logger.debug(f"Raw body: {body}")
+        logger.debug("Raw body: %s", body)
 
-        payload = json.loads(body) if isinstance(body, str) else (body or {})
-        logger.debug(f"Parsed payload: {json.dumps(payload)}")
+        payload = json_loads(body) if isinstance(body, str) else (body or {})
+        logger.debug("Parsed payload: %s", payload)
 
         user_id = payload.get("user_id")
         filename = payload.get("filename")
         content_type = payload.get("content_type", "application/octet-stream")
-        logger.debug(f"Extracted values: user_id={user_id}, filename={filename}, content_type={content_type}")
+        logger.debug("Extracted values: user_id=%s, filename=%s, content_type=%s", user_id, filename, content_type)
 
 
         if not user_id or not filename:
             logger.warning("Missing required fields")
             return respond(400, {"error": "user_id and filename are required"})
         
-        # Generate IDs and keys
-        image_id = str(uuid.uuid4())
-        obj_key = f"{user_id}/{image_id}_{filename}"
-        logger.debug(f"Generated image_id={image_id}, obj_key={obj_key}")
-
-
-        # Generate presigned PUT URL
-        logger.debug("Generating presigned URL...")
-        try:
-            upload_url = S3.generate_presigned_url(
-                "put_object",
-                Params={"Bucket": BUCKET_NAME, "Key": obj_key, "ContentType": content_type},
-                ExpiresIn=PRESIGN_EXP,
-                HttpMethod="PUT",
-            )
-            logger.debug("Presigned URL generated successfully")
-        except Exception as s3_error:
-            logger.error(f"S3 presign error: {str(s3_error)}")
-            raise
-
-
-        # create an item in dynamodb recording pending upload
-        now = int(time.time())
-        logger.debug("Writing to DynamoDB...")
-        try:
-            DDB.put_item(
+        # Generate IDs and keys; the conditional put rejects an (astronomically unlikely)
+        # image_id collision, in which case we retry once with a fresh id
+        for attempt in range(2):
+            image_id = uuid.uuid4().hex
+            obj_key = f"{user_id}/{image_id}_{filename}"
+            logger.debug("Generated image_id=%s, obj_key=%s", image_id, obj_key)
+
+            # create an item in dynamodb recording pending upload
+            now = time.time_ns() // 1_000_000_000
+            logger.debug("Writing to DynamoDB...")
+            put_future = _EXEC.submit(
+                DDB.put_item,
                 TableName=TABLE_NAME,
                 Item={
                     "user_id": {"S": user_id},
@@ -99,11 +103,39 @@ def handler(event, context):
                     "status": {"S": "PENDING_UPLOAD"},
                     "created_at": {"N": str(now)},
                 },
+                ConditionExpression="attribute_not_exists(image_id)",
             )
-            logger.debug("DynamoDB write successful")
-        except Exception as ddb_error:
-            logger.error(f"DynamoDB error: {str(ddb_error)}")
-            raise
+
+            # Generate presigned PUT URL while the DynamoDB write is in flight
+            logger.debug("Generating presigned URL...")
+            try:
+                upload_url = S3.generate_presigned_url(
+                    "put_object",
+                    Params={"Bucket": BUCKET_NAME, "Key": obj_key, "ContentType": content_type},
+                    ExpiresIn=PRESIGN_EXP,
+                    HttpMethod="PUT",
+                )
+                logger.debug("Presigned URL generated successfully")
+            except Exception as s3_error:
+                logger.error("S3 presign error: %s", s3_error)
+                if not put_future.cancel():
+                    _discard_pending_item(put_future, user_id, image_id)
+                raise
+
+            try:
+                put_future.result()
+                logger.debug("DynamoDB write successful")
+                break
+            except ClientError as ddb_error:
+                code = ddb_error.response.get("Error", {}).get("Code")
+                if code == "ConditionalCheckFailedException" and attempt == 0:
+                    logger.warning("image_id collision for %s; retrying with a new id", image_id)
+                    continue
+                logger.error("DynamoDB error: %s", ddb_error)
+                raise
+            except Exception as ddb_error:
+                logger.error("DynamoDB error: %s", ddb_error)
+                raise
 
         response = {
             "upload_url": upload_url,
@@ -112,9 +144,9 @@ def handler(event, context):
             "expires_in": PRESIGN_EXP,
             "image_id": image_id,
         }
-        logger.debug(f"Returning successful response: {json.dumps(response)}")
+        logger.debug("Returning successful response: %s", response)
         return respond(200, response)
 
     except Exception as e:
-        logger.error(f"Unhandled error: {str(e)}", exc_info=True)
+        logger.error("Unhandled error: %s", e, exc_info=True)
         return respond(500, {"error": str(e)})
@@ -8,9 +8,103 @@ def test_deserialize_item_empty():
 def test_deserialize_items_empty_list():
     assert aws_clients.deserialize_items([]) == []
 
-def test_convert_decimals_roundtrip():
-    # build object with nested decimals by calling internal helper via deserialize_item simulation
+def test_boto3_client_is_cached_per_service(monkeypatch):
+    monkeypatch.setenv("AWS_REGION", "eu-west-1")
+    aws_clients.reset_clients()
+    try:
+        first = aws_clients.boto3_client("s3")
+        assert aws_clients.boto3_client("s3") is first
+        assert first.meta.region_name == "eu-west-1"
+    finally:
+        monkeypatch.undo()
+        aws_clients.reset_clients()
+
+def test_deserialize_item_keeps_nested_decimals():
     from decimal import Decimal
-    # simulate already deserialized raw python data to _convert_decimals via deserialize_item side-effects:
-    # we can't access _convert_decimals directly (private), but passing an empty item returns {}
-    assert aws_clients.deserialize_item({}) == {}
\ No newline at end of file
+    item = aws_clients.deserialize_item({"size": {"N": "42"}, "dims": {"M": {"w": {"N": "1.5"}}}})
+    assert item == {"size": 42, "dims": {"w": Decimal("1.5")}}
+    assert aws_clients.json_loads(aws_clients.json_dumps(item)) == {"size": 42, "dims": {"w": 1.5}}
+
+
+def test_deserialize_items_scalars():
+    items = [{"image_id": {"S": "img1"}, "created_at": {"N": "1700000000"}, "delta": {"N": "-3"}, "ratio": {"N": "0.25"}}]
+    assert aws_clients.deserialize_items(items) == [{"image_id": "img1", "created_at": 1700000000, "delta": -3, "ratio": 0.25}]
+    assert type(aws_clients.deserialize_items(items)[0]["created_at"]) is int
+
+def test_decimal_encoder_writes_int_or_float():
+    item = aws_clients.deserialize_item({"created_at": {"N": "1700000000"}, "ratio": {"N": "0.5"}, "tags": {"L": [{"N": "3"}]}})
+    body = json.dumps(item, cls=aws_clients.DecimalEncoder, separators=(",", ":"))
+    assert json.loads(body) == {"created_at": 1700000000, "ratio": 0.5, "tags": [3]}
+    assert "1700000000" in body and "1700000000." not in body
+    assert aws_clients.json_loads(aws_clients.json_dumps(item)) == json.loads(body)
+
+def test_presign_get_matches_botocore_sigv4(monkeypatch):
+    import datetime
+    import boto3
+    from unittest import mock
+    from urllib.parse import urlsplit, parse_qs
+    from botocore.config import Config
+
+    fixed = datetime.datetime(2024, 1, 1, 12, 0, 0)
+
+    class _FixedDatetime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed.replace(tzinfo=tz)
+
+    monkeypatch.setenv("LOCALSTACK_ENDPOINT", "http://localstack:4566")
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.delenv("AWS_SESSION_TOKEN", raising=False)
+    aws_clients.reset_clients()
+    try:
+        s3 = boto3.client(
+            "s3",
+            endpoint_url="http://localstack:4566",
+            region_name="us-east-1",
+            aws_access_key_id="test",
+            aws_secret_access_key="test",
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+        key = "alice/img1_my pic+1.png"
+        with mock.patch("botocore.auth.get_current_datetime", return_value=fixed):
+            expected = urlsplit(s3.generate_presigned_url("get_object", Params={"Bucket": "bkt", "Key": key}, ExpiresIn=900))
+        with mock.patch.object(aws_clients.datetime, "datetime", _FixedDatetime):
+            actual = urlsplit(aws_clients.presign_get("bkt", key, 900))
+        assert (actual.netloc, actual.path) == (expected.netloc, expected.path)
+        assert parse_qs(actual.query) == parse_qs(expected.query)
+    finally:
+        monkeypatch.undo()
+        aws_clients.reset_clients()
+
+def test_resolve_log_level_falls_back_to_info():
+    import logging
+    assert aws_clients._resolve_log_level("debug") == logging.DEBUG
+    assert aws_clients._resolve_log_level(" WARNING ") == logging.WARNING
+    assert aws_clients._resolve_log_level("verbose") == logging.INFO
+    assert aws_clients._resolve_log_level("") == logging.INFO
+
+def test_warm_clients_off_by_default_outside_lambda(monkeypatch):
+    from unittest.mock import MagicMock
+    monkeypatch.delenv("WARMUP", raising=False)
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    s3 = MagicMock()
+    aws_clients.warm_clients(s3, "bucket")
+    assert not s3.generate_presigned_url.called
+
+def test_warm_clients_runs_with_warmup_flag(monkeypatch):
+    from unittest.mock import MagicMock
+    monkeypatch.setenv("WARMUP", "1")
+    s3 = MagicMock()
+    aws_clients.warm_clients(s3, "bucket")
+    assert s3.generate_presigned_url.call_args.kwargs["Params"] == {"Bucket": "bucket", "Key": "__warmup__"}
+
+def test_warm_clients_logs_and_swallows_errors(monkeypatch, caplog):
+    from unittest.mock import MagicMock
+    monkeypatch.setenv("WARMUP", "1")
+    s3 = MagicMock()
+    s3.generate_presigned_url.side_effect = RuntimeError("signer unavailable")
+    with caplog.at_level("WARNING", logger=aws_clients.logger.name):
+        aws_clients.warm_clients(s3, "bucket")
+    assert "Client warm-up failed: signer unavailable" in caplog.text
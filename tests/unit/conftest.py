@@ -1,40 +1,120 @@
 import os
 import json
+import importlib
 import pytest
-from unittest.mock import MagicMock
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from freezegun import freeze_time
 
-@pytest.fixture(autouse=True)
-def env_vars(monkeypatch):
-    # sensible defaults for handlers
-    monkeypatch.setenv("BUCKET_NAME", os.environ.get("BUCKET_NAME", "image-service-root"))
-    monkeypatch.setenv("TABLE_NAME", os.environ.get("TABLE_NAME", "ImagesMetadata"))
-    monkeypatch.setenv("PRESIGN_EXP", os.environ.get("PRESIGN_EXP", "900"))
-    monkeypatch.setenv("PAGE_SIZE", os.environ.get("PAGE_SIZE", "10"))
-    return monkeypatch
-
-@pytest.fixture
+@pytest.fixture(scope="module", autouse=True)
+def env_vars():
+    # sensible defaults for handlers, applied once per test module
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("BUCKET_NAME", os.environ.get("BUCKET_NAME", "image-service-root"))
+        mp.setenv("TABLE_NAME", os.environ.get("TABLE_NAME", "ImagesMetadata"))
+        mp.setenv("PRESIGN_EXP", os.environ.get("PRESIGN_EXP", "900"))
+        mp.setenv("PAGE_SIZE", os.environ.get("PAGE_SIZE", "10"))
+        yield mp
+
+@pytest.fixture(scope="module", autouse=True)
+def _freeze():
+    # pin the clock so timestamps written by handlers are deterministic
+    with freeze_time("2024-01-01"):
+        yield
+
+class _Call(NamedTuple):
+    """Recorded call; unpacks as ``args, kwargs`` like ``unittest.mock.call``."""
+    args: tuple
+    kwargs: dict
+
+class _StubMethod:
+    """
+    Minimal stand-in for a MagicMock client method. Supports return_value, side_effect
+    (an exception or a list consumed one item per call) and the call-record attributes
+    the tests read, without MagicMock's per-attribute child-mock overhead.
+    """
+    __slots__ = ("return_value", "side_effect", "call_args_list")
+
+    def __init__(self, return_value: Any = None):
+        self.return_value = return_value
+        self.side_effect = None
+        self.call_args_list: List[_Call] = []
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        self.call_args_list.append(_Call(args, kwargs))
+        effect = self.side_effect
+        if effect is None:
+            return self.return_value
+        if isinstance(effect, BaseException):
+            raise effect
+        if isinstance(effect, list):
+            result = effect.pop(0)
+            if isinstance(result, BaseException):
+                raise result
+            return result
+        return effect(*args, **kwargs)
+
+    @property
+    def called(self) -> bool:
+        return bool(self.call_args_list)
+
+    @property
+    def call_count(self) -> int:
+        return len(self.call_args_list)
+
+    @property
+    def call_args(self) -> Optional[_Call]:
+        return self.call_args_list[-1] if self.call_args_list else None
+
+class _StubClient:
+    # method name -> factory for its default return value
+    _DEFAULTS: Dict[str, Callable[[], Any]] = {}
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        for name, default in self._DEFAULTS.items():
+            setattr(self, name, _StubMethod(default()))
+
+class _StubS3(_StubClient):
+    _DEFAULTS = {
+        "generate_presigned_url": lambda: "https://signed.example/object",
+        "delete_object": dict,
+        "delete_objects": dict,
+    }
+
+class _StubDDB(_StubClient):
+    # default stubs; test cases override return_value as needed
+    _DEFAULTS = {
+        "put_item": dict,
+        "query": lambda: {"Items": []},
+        "get_item": dict,
+        "update_item": dict,
+        "delete_item": dict,
+        "batch_get_item": lambda: {"Responses": {}},
+        "batch_write_item": dict,
+    }
+
+@pytest.fixture(scope="module")
 def mock_s3():
-    m = MagicMock()
-    m.generate_presigned_url = MagicMock(return_value="https://signed.example/object")
-    m.delete_object = MagicMock(return_value={})
-    return m
+    return _StubS3()
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_ddb():
-    m = MagicMock()
-    # default stubs; test cases override return_value as needed
-    m.put_item = MagicMock(return_value={})
-    m.query = MagicMock(return_value={"Items": [],})
-    m.get_item = MagicMock(return_value={})
-    m.update_item = MagicMock(return_value={})
-    m.delete_item = MagicMock(return_value={})
-    return m
-
-@pytest.fixture
-def patch_clients(monkeypatch, mock_s3, mock_ddb):
+    return _StubDDB()
+
+@pytest.fixture(autouse=True)
+def _reset_mocks(mock_s3, mock_ddb):
+    """Give every test clean call records and default return values on the shared stubs."""
+    # handlers reach the stubs through _patch_handler even when a test doesn't request them
+    mock_s3.reset()
+    mock_ddb.reset()
+
+@pytest.fixture(scope="module")
+def patch_clients(mock_s3, mock_ddb):
     """
     Replace module-level S3/DDB objects inside each lambda module after import.
-    Tests will import handler modules and then rely on these monkeypatches.
+    Tests will import handler modules and then rely on these replacements.
     """
     # provide factory to apply replacements after import
     def _apply(module):
@@ -42,4 +122,18 @@ def patch_clients(monkeypatch, mock_s3, mock_ddb):
         setattr(module, "S3", mock_s3)
         setattr(module, "DDB", mock_ddb)
         return module
-    return _apply
\ No newline at end of file
+    return _apply
+
+@pytest.fixture(scope="module")
+def handler_module(request):
+    """
+    Handler module named by the test module's HANDLER_MODULE dotted path. It is
+    imported on first use, so collecting a test file doesn't import its handler.
+    """
+    return importlib.import_module(request.module.HANDLER_MODULE)
+
+@pytest.fixture(scope="module", autouse=True)
+def _patch_handler(request):
+    # the stubs are module-scoped, so patching once covers every test in the module
+    if getattr(request.module, "HANDLER_MODULE", None) is not None:
+        request.getfixturevalue("patch_clients")(request.getfixturevalue("handler_module"))
@@ -2,13 +2,13 @@ import json
 from unittest.mock import MagicMock
 import lambdas.delete_images.handler as delete_mod
 
-def test_delete_images_deletes_s3_only_when_uploaded(patch_clients, mock_s3, mock_ddb):
-    patch_clients(delete_mod)
-    # prepare _get_ddb_item to return uploaded item
+HANDLER_MODULE = "lambdas.delete_images.handler"
+
+def test_delete_images_deletes_s3_only_when_uploaded(mock_s3, mock_ddb, monkeypatch):
+    # delete_item (ALL_OLD) returns the uploaded item
     uploaded_item = {"user_id": "alice", "image_id": "img1", "status": "UPLOADED", "s3_key": "alice/img1_a.png"}
-    # monkeypatch module-level helper to return item
-    delete_mod.deserialize_item = lambda x: uploaded_item
-    delete_mod._get_ddb_item = lambda u, i: uploaded_item
+    monkeypatch.setattr(delete_mod, "deserialize_item", lambda x: uploaded_item)
+    mock_ddb.delete_item.return_value = {"Attributes": {"image_id": {"S": "img"}}}
 
     ev = {"body": json.dumps({"user_id": "alice", "image_id": "img1"})}
     resp = delete_mod.handler(ev, None)
@@ -19,11 +19,10 @@ def test_delete_images_deletes_s3_only_when_uploaded(patch_clients, mock_s3, moc
     assert mock_s3.delete_object.called
     assert mock_ddb.delete_item.called
 
-def test_delete_images_skips_s3_when_not_uploaded(patch_clients, mock_s3, mock_ddb):
-    patch_clients(delete_mod)
+def test_delete_images_skips_s3_when_not_uploaded(mock_s3, mock_ddb, monkeypatch):
     not_uploaded_item = {"user_id": "alice", "image_id": "img2", "status": "PENDING_UPLOAD", "s3_key": "alice/img2_b.png"}
-    delete_mod.deserialize_item = lambda x: not_uploaded_item
-    delete_mod._get_ddb_item = lambda u, i: not_uploaded_item
+    monkeypatch.setattr(delete_mod, "deserialize_item", lambda x: not_uploaded_item)
+    mock_ddb.delete_item.return_value = {"Attributes": {"image_id": {"S": "img"}}}
 
     ev = {"body": json.dumps({"user_id": "alice", "image_id": "img2"})}
     resp = delete_mod.handler(ev, None)
@@ -31,4 +30,83 @@ def test_delete_images_skips_s3_when_not_uploaded(patch_clients, mock_s3, mock_d
     body = json.loads(resp["body"])
     assert body["s3_deleted"] is False
     assert mock_s3.delete_object.called is False or mock_s3.delete_object.call_count == 0
-    assert mock_ddb.delete_item.called
\ No newline at end of file
+    assert mock_ddb.delete_item.called
+
+def test_delete_images_conditional_delete_returns_404(mock_s3, mock_ddb):
+    from botocore.exceptions import ClientError
+    mock_ddb.delete_item.side_effect = ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException", "Message": "missing"}}, "DeleteItem")
+
+    ev = {"body": json.dumps({"user_id": "alice", "image_id": "gone"})}
+    resp = delete_mod.handler(ev, None)
+    assert resp["statusCode"] == 404
+    kwargs = mock_ddb.delete_item.call_args.kwargs
+    assert kwargs["ConditionExpression"] == "attribute_exists(image_id)"
+    assert kwargs["ReturnValues"] == "ALL_OLD"
+    assert not mock_ddb.get_item.called
+    assert not mock_s3.delete_object.called
+
+def _ddb_row(image_id, status):
+    return {
+        "user_id": {"S": "alice"},
+        "image_id": {"S": image_id},
+        "status": {"S": status},
+        "s3_key": {"S": f"alice/{image_id}_x.png"},
+    }
+
+def test_delete_images_bulk_batches_s3_and_ddb_calls(mock_s3, mock_ddb):
+    mock_ddb.batch_get_item.return_value = {"Responses": {delete_mod.TABLE_NAME: [
+        _ddb_row("img1", "UPLOADED"),
+        _ddb_row("img2", "PENDING_UPLOAD"),
+        _ddb_row("img3", "UPLOADED"),
+    ]}}
+    mock_s3.delete_objects.return_value = {"Errors": [{"Key": "alice/img3_x.png", "Message": "denied"}]}
+
+    ev = {"body": json.dumps({"user_id": "alice", "image_ids": ["img1", "img2", "img3", "missing"]})}
+    resp = delete_mod.handler(ev, None)
+    assert resp["statusCode"] == 200
+    results = {r["image_id"]: r for r in json.loads(resp["body"])["results"]}
+    # one BatchGetItem, one DeleteObjects (UPLOADED keys only), one BatchWriteItem
+    assert mock_ddb.batch_get_item.call_count == 1
+    assert "ConsistentRead" not in mock_ddb.batch_get_item.call_args.kwargs["RequestItems"][delete_mod.TABLE_NAME]
+    assert not mock_ddb.get_item.called
+    objects = mock_s3.delete_objects.call_args.kwargs["Delete"]["Objects"]
+    assert objects == [{"Key": "alice/img1_x.png"}, {"Key": "alice/img3_x.png"}]
+    assert not mock_s3.delete_object.called
+    writes = mock_ddb.batch_write_item.call_args.kwargs["RequestItems"][delete_mod.TABLE_NAME]
+    assert len(writes) == 3
+    assert not mock_ddb.delete_item.called
+    assert results["img1"]["s3_deleted"] is True
+    assert results["img2"]["s3_deleted"] is False
+    assert results["img3"]["s3_deleted"] is False
+    assert results["img1"]["ddb_deleted"] is True
+    assert results["missing"]["error"] == "image not found"
+
+def test_delete_images_bulk_retries_unprocessed_items(mock_ddb, monkeypatch):
+    monkeypatch.setattr(delete_mod.time, "sleep", lambda s: None)
+    mock_ddb.batch_get_item.return_value = {"Responses": {delete_mod.TABLE_NAME: [_ddb_row("img1", "PENDING_UPLOAD")]}}
+    unprocessed = {delete_mod.TABLE_NAME: [{"DeleteRequest": {"Key": {"user_id": {"S": "alice"}, "image_id": {"S": "img1"}}}}]}
+    mock_ddb.batch_write_item.side_effect = [{"UnprocessedItems": unprocessed}, {}]
+
+    ev = {"body": json.dumps({"user_id": "alice", "image_ids": ["img1"]})}
+    resp = delete_mod.handler(ev, None)
+    assert resp["statusCode"] == 200
+    assert mock_ddb.batch_write_item.call_count == 2
+    assert mock_ddb.batch_write_item.call_args.kwargs["RequestItems"] == unprocessed
+    assert json.loads(resp["body"])["results"][0]["ddb_deleted"] is True
+
+def test_delete_images_bulk_normalizes_numeric_ids(mock_s3, mock_ddb):
+    mock_ddb.batch_get_item.return_value = {"Responses": {delete_mod.TABLE_NAME: [_ddb_row("123", "UPLOADED")]}}
+
+    ev = {"body": json.dumps({"user_id": "alice", "image_ids": [123]})}
+    resp = delete_mod.handler(ev, None)
+    assert resp["statusCode"] == 200
+    result, = json.loads(resp["body"])["results"]
+    assert result == {"image_id": "123", "s3_key": "alice/123_x.png", "s3_deleted": True, "ddb_deleted": True}
+    assert mock_s3.delete_objects.call_args.kwargs["Delete"]["Objects"] == [{"Key": "alice/123_x.png"}]
+
+def test_delete_images_bulk_rejects_non_scalar_ids(mock_ddb):
+    ev = {"body": json.dumps({"user_id": "alice", "image_ids": [{"id": "img1"}]})}
+    resp = delete_mod.handler(ev, None)
+    assert resp["statusCode"] == 400
+    assert not mock_ddb.batch_get_item.called
@@ -2,9 +2,9 @@ import json
 from unittest.mock import MagicMock
 import lambdas.list_images.handler as list_mod
 
-def test_list_images_returns_signed_urls_only_for_uploaded(patch_clients, mock_s3, mock_ddb):
-    patch_clients(list_mod)
+HANDLER_MODULE = "lambdas.list_images.handler"
 
+def test_list_images_returns_signed_urls_only_for_uploaded(mock_ddb, monkeypatch):
     # Prepare DDB.query to return two items (AttributeValue style) - deserialize_items will be monkeypatched
     mock_ddb.query.return_value = {"Items": [{"dummy": {"S": "1"}}, {"dummy": {"S": "2"}}], "LastEvaluatedKey": {"user_id": {"S": "alice"}, "image_id": {"S": "next"}}}
 
@@ -14,7 +14,7 @@ def test_list_images_returns_signed_urls_only_for_uploaded(patch_clients, mock_s
             {"image_id": "img1", "filename": "a.png", "content_type": "image/png", "status": "UPLOADED", "s3_key": "alice/img1_a.png"},
             {"image_id": "img2", "filename": "b.png", "content_type": "image/png", "status": "PENDING_UPLOAD", "s3_key": "alice/img2_b.png"},
         ]
-    list_mod.deserialize_items = fake_deserialize
+    monkeypatch.setattr(list_mod, "deserialize_items", fake_deserialize)
 
     # call handler
     ev = {"body": json.dumps({"user_id": "alice"})}
@@ -31,9 +31,79 @@ def test_list_images_returns_signed_urls_only_for_uploaded(patch_clients, mock_s
     assert "signed_url" not in items[1]
     # pagination token returned
     assert "next_page_token" in body
+    # only the response attributes are fetched from DynamoDB
+    query_kwargs = mock_ddb.query.call_args.kwargs
+    projected = {query_kwargs["ExpressionAttributeNames"][n] for n in query_kwargs["ProjectionExpression"].split(",")}
+    assert {"image_id", "filename", "content_type", "created_at", "status", "s3_key", "bucket"} <= projected
 
-def test_list_images_missing_userid_returns_400(patch_clients, mock_s3, mock_ddb):
-    patch_clients(list_mod)
+def test_list_images_missing_userid_returns_400():
     ev = {"body": json.dumps({})}
     resp = list_mod.handler(ev, None)
-    assert resp["statusCode"] == 400
\ No newline at end of file
+    assert resp["statusCode"] == 400
+
+
+def test_list_images_fetch_all_follows_pagination(mock_ddb, monkeypatch):
+    monkeypatch.setattr(list_mod, "deserialize_items", lambda items: [{"image_id": i["image_id"]["S"], "status": "PENDING_UPLOAD"} for i in items])
+    first_key = {"user_id": {"S": "alice"}, "image_id": {"S": "img2"}}
+    mock_ddb.query.side_effect = [
+        {"Items": [{"image_id": {"S": "img1"}}, {"image_id": {"S": "img2"}}], "LastEvaluatedKey": first_key},
+        {"Items": [{"image_id": {"S": "img3"}}]},
+    ]
+
+    ev = {"body": json.dumps({"user_id": "alice", "page_size": 2, "fetch_all": True})}
+    resp = list_mod.handler(ev, None)
+    assert resp["statusCode"] == 200
+    body = json.loads(resp["body"])
+    assert [it["image_id"] for it in body["items"]] == ["img1", "img2", "img3"]
+    assert "next_page_token" not in body
+    first_call, second_call = mock_ddb.query.call_args_list
+    assert first_call.kwargs["Limit"] == 2
+    assert second_call.kwargs["ExclusiveStartKey"] == first_key
+
+def test_list_images_fetch_all_stops_at_max_total(mock_ddb, monkeypatch):
+    monkeypatch.setattr(list_mod, "MAX_TOTAL", 3)
+    monkeypatch.setattr(list_mod, "deserialize_items", lambda items: [{"image_id": i["image_id"]["S"], "status": "PENDING_UPLOAD"} for i in items])
+    first_key = {"user_id": {"S": "alice"}, "image_id": {"S": "img2"}}
+    second_key = {"user_id": {"S": "alice"}, "image_id": {"S": "img3"}}
+    mock_ddb.query.side_effect = [
+        {"Items": [{"image_id": {"S": "img1"}}, {"image_id": {"S": "img2"}}], "LastEvaluatedKey": first_key},
+        {"Items": [{"image_id": {"S": "img3"}}], "LastEvaluatedKey": second_key},
+    ]
+
+    ev = {"body": json.dumps({"user_id": "alice", "page_size": 2, "fetch_all": True})}
+    resp = list_mod.handler(ev, None)
+    assert resp["statusCode"] == 200
+    body = json.loads(resp["body"])
+    assert [it["image_id"] for it in body["items"]] == ["img1", "img2", "img3"]
+    # the cap was hit with more data left, so the caller can resume from here
+    assert body["next_page_token"] == list_mod._encode_token(second_key)
+    assert mock_ddb.query.call_count == 2
+    assert mock_ddb.query.call_args.kwargs["Limit"] == 1
+
+def test_list_images_fetch_all_without_page_size_requests_remaining_items(mock_ddb, monkeypatch):
+    monkeypatch.setattr(list_mod, "deserialize_items", lambda items: [{"image_id": i["image_id"]["S"], "status": "PENDING_UPLOAD"} for i in items])
+    first_key = {"user_id": {"S": "alice"}, "image_id": {"S": "img2"}}
+    mock_ddb.query.side_effect = [
+        {"Items": [{"image_id": {"S": "img1"}}, {"image_id": {"S": "img2"}}], "LastEvaluatedKey": first_key},
+        {"Items": [{"image_id": {"S": "img3"}}]},
+    ]
+
+    ev = {"body": json.dumps({"user_id": "alice", "fetch_all": True})}
+    resp = list_mod.handler(ev, None)
+    assert resp["statusCode"] == 200
+    first_call, second_call = mock_ddb.query.call_args_list
+    # not PAGE_SIZE: each page is bounded only by MAX_TOTAL and DynamoDB's 1 MB cutoff
+    assert first_call.kwargs["Limit"] == list_mod.MAX_TOTAL
+    assert second_call.kwargs["Limit"] == list_mod.MAX_TOTAL - 2
+
+def test_list_images_invalid_page_size_returns_400():
+    ev = {"body": json.dumps({"user_id": "alice", "page_size": "lots"})}
+    resp = list_mod.handler(ev, None)
+    assert resp["statusCode"] == 400
+
+def test_page_token_roundtrip():
+    key = {"user_id": {"S": "alice"}, "image_id": {"S": "img-1"}}
+    token = list_mod._encode_token(key)
+    assert "=" not in token
+    assert list_mod._decode_token(token) == key
+    assert list_mod._decode_token("not a token!") is None
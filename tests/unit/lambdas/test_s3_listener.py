@@ -2,6 +2,8 @@ import json
 from unittest.mock import MagicMock
 import lambdas.s3_listener.handler as sl_mod
 
+HANDLER_MODULE = "lambdas.s3_listener.handler"
+
 def make_s3_event(bucket, key):
     return {
         "Records": [
@@ -14,8 +16,7 @@ def make_s3_event(bucket, key):
         ]
     }
 
-def test_s3_listener_updates_ddb_for_sqs_records(patch_clients, mock_s3, mock_ddb):
-    patch_clients(sl_mod)
+def test_s3_listener_updates_ddb_for_sqs_records(mock_ddb):
     # Build SQS-style event: body is JSON string of S3 event
     s3_event = make_s3_event("image-service-root", "alice/img1_a.png")
     sqs_event = {"Records": [{"body": json.dumps(s3_event)}]}
@@ -24,5 +25,28 @@ def test_s3_listener_updates_ddb_for_sqs_records(patch_clients, mock_s3, mock_dd
     body = json.loads(resp["body"])
     # ensure update_item was called
     assert mock_ddb.update_item.called
-    args, kwargs = mock_ddb.update_item.call_args
-    assert "TableName" in kwargs or len(args) >= 1
\ No newline at end of file
+    ca = mock_ddb.update_item.call_args
+    assert "TableName" in ca.kwargs or ca.args
+
+
+def test_parse_s3_key():
+    assert sl_mod._parse_s3_key("alice/img1_a.png") == ("alice", "img1")
+    assert sl_mod._parse_s3_key("alice/img1_my+pic_2.png") == ("alice", "img1")
+    assert sl_mod._parse_s3_key("alice%40x/img1_a.png") == ("alice@x", "img1")
+    assert sl_mod._parse_s3_key("alice/noseparator.png") == (None, None)
+    assert sl_mod._parse_s3_key("no-slash_a.png") == (None, None)
+    assert sl_mod._parse_s3_key("") == (None, None)
+
+def test_s3_listener_dedupes_updates_across_records(mock_ddb):
+    keys = ["alice/img1_a.png", "alice/img2_b.png", "alice/img1_a.png", "bad-key"]
+    sqs_event = {"Records": [{"body": json.dumps(make_s3_event("image-service-root", k))} for k in keys]}
+    resp = sl_mod.handler(sqs_event, None)
+    assert resp["statusCode"] == 200
+    processed = json.loads(resp["body"])["processed"]
+    assert [p.get("image_id") for p in processed] == ["img1", "img2", "img1", None]
+    assert [p.get("ddb_updated") for p in processed[:3]] == [True, True, True]
+    assert processed[3]["status"] == "skipped"
+    # img1 appears twice but is only updated once
+    assert mock_ddb.update_item.call_count == 2
+    updated_ids = sorted(c.kwargs["Key"]["image_id"]["S"] for c in mock_ddb.update_item.call_args_list)
+    assert updated_ids == ["img1", "img2"]
@@ -1,30 +1,90 @@
 import json
+import pytest
+from typing import Any, Callable
 from unittest.mock import MagicMock
-import lambdas.upload_images.handler as upload_mod
 
-def make_event(payload):
-    return {"body": json.dumps(payload)}
+_loads: Callable[[Any], Any]
+try:
+    from orjson import loads as _loads
+except ImportError:  # orjson is optional, same as in common.aws_clients
+    from json import loads as _loads
 
-def test_upload_images_generates_presign_and_writes_ddb(patch_clients, mock_s3, mock_ddb, env_vars):
-    # apply patches to module
-    patch_clients(upload_mod)
+# the handler accepts a pre-parsed dict body, so most cases skip the dumps/loads round trip;
+# the JSON string form (as sent by API Gateway) is still exercised by the retry test
+_UPLOAD_OK_PAYLOAD = {"user_id": "alice", "filename": "pic.png", "content_type": "image/png"}
+_UPLOAD_BAD_PAYLOAD = {"filename": "pic.png"}
+_UPLOAD_OK_BODY = json.dumps(_UPLOAD_OK_PAYLOAD)
 
-    mock_s3.generate_presigned_url.return_value = "https://signed-put.example/obj"
-    # call handler
-    ev = make_event({"user_id": "alice", "filename": "pic.png", "content_type": "image/png"})
-    resp = upload_mod.handler(ev, None)
+# the handler only reads the event, so one dict is reused and its body rebound per call
+_EVENT = {"body": None}
+
+def make_event(body) -> dict:
+    _EVENT["body"] = body
+    return _EVENT
+
+# imported lazily by the handler_module fixture so collecting this file doesn't pull in boto3
+HANDLER_MODULE = "lambdas.upload_images.handler"
+
+def _check_ok(body: dict, mock_ddb) -> None:
+    # one structural compare, so a failure shows every mismatch at once
+    call = mock_ddb.put_item.call_args
+    kwargs = call.kwargs if call else {}
+    actual = {
+        "upload_url": body.get("upload_url", body.get("uploadUrl")),
+        "ddb_called": mock_ddb.put_item.called,
+        "table_present": "TableName" in kwargs,
+        "created_at": kwargs.get("Item", {}).get("created_at"),
+    }
+    assert actual == {
+        "upload_url": "https://signed.example/object",
+        "ddb_called": True,
+        "table_present": True,
+        "created_at": {"N": "1704067200"},  # 2024-01-01T00:00:00Z
+    }
+
+def _check_err(body: dict, mock_ddb) -> None:
+    assert "error" in body
+
+@pytest.mark.parametrize("payload,expected_status,check", [
+    (_UPLOAD_OK_PAYLOAD, 200, _check_ok),
+    (_UPLOAD_BAD_PAYLOAD, 400, _check_err),
+], ids=["ok", "missing_user_id"])
+def test_upload_images(payload, expected_status, check, handler_module, mock_ddb):
+    resp = handler_module.handler(make_event(payload), None)
+    assert resp["statusCode"] == expected_status
+    check(_loads(resp["body"]), mock_ddb)
+
+def test_upload_images_retries_on_image_id_collision(handler_module, mock_s3, mock_ddb):
+    from botocore.exceptions import ClientError
+    mock_ddb.put_item.side_effect = [
+        ClientError({"Error": {"Code": "ConditionalCheckFailedException", "Message": "exists"}}, "PutItem"),
+        {},
+    ]
+    resp = handler_module.handler(make_event(_UPLOAD_OK_BODY), None)
     assert resp["statusCode"] == 200
-    body = json.loads(resp["body"])
-    assert "upload_url" in body or "uploadUrl" in body or body.get("upload_url", body.get("uploadUrl"))
-    # DDB.put_item called with expected keys
-    assert mock_ddb.put_item.called
-    args, kwargs = mock_ddb.put_item.call_args
-    assert "TableName" in kwargs or len(args) >= 1
-
-def test_upload_images_missing_userid_returns_400(patch_clients, mock_s3, mock_ddb):
-    patch_clients(upload_mod)
-    ev = make_event({"filename": "pic.png"})
-    resp = upload_mod.handler(ev, None)
-    assert resp["statusCode"] == 400
-    body = json.loads(resp["body"])
-    assert "error" in body
\ No newline at end of file
+    body = _loads(resp["body"])
+    first, second = mock_ddb.put_item.call_args_list
+    assert first.kwargs["ConditionExpression"] == "attribute_not_exists(image_id)"
+    assert first.kwargs["Item"]["image_id"] != second.kwargs["Item"]["image_id"]
+    assert body["image_id"] == second.kwargs["Item"]["image_id"]["S"]
+    assert mock_s3.generate_presigned_url.call_count == 2
+
+def test_upload_images_presign_failure_removes_pending_item(handler_module, mock_s3, mock_ddb):
+    import threading
+    put_started = threading.Event()
+
+    def put_item(**kwargs):
+        put_started.set()
+        return {}
+
+    def presign(*args, **kwargs):
+        # fail only once the write is already running, so it can no longer be cancelled
+        put_started.wait(5)
+        raise RuntimeError("signing failed")
+
+    mock_ddb.put_item.side_effect = put_item
+    mock_s3.generate_presigned_url.side_effect = presign
+    resp = handler_module.handler(make_event(_UPLOAD_OK_PAYLOAD), None)
+    assert resp["statusCode"] == 500
+    item = mock_ddb.put_item.call_args.kwargs["Item"]
+    assert mock_ddb.delete_item.call_args.kwargs["Key"] == {"user_id": item["user_id"], "image_id": item["image_id"]}